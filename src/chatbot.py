@@ -1,10 +1,11 @@
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 from pdf_processor import PDFProcessor
 import requests
 from config import get_db
-from models import LawDocument
+from models import LawDocument, LawChunk
+from llm_client import LLMClient
+from retrieval_cache import RetrievalCache
 import re
 from typing import List
 
@@ -13,8 +14,10 @@ load_dotenv()
 
 class PDFChatBot:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.llm = LLMClient()
         self.pdf_processor = PDFProcessor()
+        self.retrieval_cache = RetrievalCache()
+        self.pdf_processor.add_law_update_listener(self.retrieval_cache.invalidate_law)
         self.update_laws_context()
         
     def update_laws_context(self):
@@ -34,6 +37,7 @@ class PDFChatBot:
                 📊 Resumen de sincronización:
                 - PDFs eliminados: {sync_result['deleted']}
                 - PDFs nuevos: {sync_result['added']}
+                - PDFs actualizados: {sync_result['updated']}
                 - Total actual: {sync_result['current_total']}
                 """)
             
@@ -47,11 +51,14 @@ class PDFChatBot:
         Busca secciones relevantes del contenido basado en la pregunta.
         Divide el contenido en chunks y busca palabras clave.
         """
-        # Obtener palabras clave de la pregunta
-        keywords = re.findall(r'\w+', question.lower())
-        
         # Dividir el contenido en chunks
         chunks = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+        return self.rank_chunks(question, chunks)
+
+    def rank_chunks(self, question: str, chunks: List[str]) -> str:
+        """Selecciona los chunks con más palabras clave de la pregunta"""
+        # Obtener palabras clave de la pregunta
+        keywords = re.findall(r'\w+', question.lower())
         relevant_chunks = []
         
         for chunk in chunks:
@@ -93,36 +100,86 @@ class PDFChatBot:
             Si necesitas información adicional o si la información proporcionada no es suficiente, indícalo claramente."""
             
             # Primera llamada para análisis general
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            return self.llm.complete(
                 messages=[
                     {"role": "system", "content": "Eres un asistente experto en analizar documentos legales. Proporciona respuestas precisas y detalladas."},
                     {"role": "user", "content": prompt}
                 ],
+                question=question,
                 max_tokens=1000
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             return f"Error al procesar la pregunta: {str(e)}"
 
+    def retrieve_sections(self, question: str, selected_pdfs: List[str], db) -> List[dict]:
+        """
+        Obtiene las secciones relevantes de cada ley seleccionada.
+        Los resultados se guardan en la caché de recuperación; la versión de
+        cada ley (hash del PDF y si ya tiene fragmentos) forma parte de la clave.
+        """
+        # Consulta liviana: solo número, hash y si tiene fragmentos, sin cargar el contenido
+        has_chunks = (
+            db.query(LawChunk.id).filter(LawChunk.law_id == LawDocument.id).exists()
+        )
+        rows = (
+            db.query(LawDocument.law_number, LawDocument.pdf_hash, has_chunks)
+            .filter(LawDocument.law_number.in_(selected_pdfs))
+            .all()
+        )
+        if not rows:
+            return []
+        # Un backfill de fragmentos cambia lo que se sirve sin cambiar el hash
+        # del PDF, así que también cambia la versión para todos los workers
+        law_hashes = {
+            law_number: f"{pdf_hash or ''}:{'chunks' if chunked else 'content'}"
+            for law_number, pdf_hash, chunked in rows
+        }
+        
+        cache_key = self.retrieval_cache.make_key(question, law_hashes)
+        relevant_laws = self.retrieval_cache.get(cache_key)
+        
+        if relevant_laws is None:
+            relevant_laws = []
+            laws = (
+                db.query(LawDocument.id, LawDocument.law_number, LawDocument.title)
+                .filter(LawDocument.law_number.in_(law_hashes))
+                .all()
+            )
+            
+            # Los fragmentos indexados (law_chunks) son el índice que se consulta
+            chunks_by_law = {}
+            rows = (
+                db.query(LawChunk.law_id, LawChunk.content)
+                .filter(LawChunk.law_id.in_([law.id for law in laws]))
+                .order_by(LawChunk.law_id, LawChunk.chunk_index)
+                .all()
+            )
+            for law_id, chunk_content in rows:
+                chunks_by_law.setdefault(law_id, []).append(chunk_content)
+            
+            for law in laws:
+                if law.id in chunks_by_law:
+                    relevant_content = self.rank_chunks(question, chunks_by_law[law.id])
+                else:
+                    # Ley aún sin fragmentos: se recorre el contenido completo
+                    content = db.query(LawDocument.content).filter_by(id=law.id).scalar() or ""
+                    relevant_content = self.find_relevant_sections(question, content)
+                relevant_laws.append({
+                    'law_number': law.law_number,
+                    'title': law.title,
+                    'content': relevant_content
+                })
+            self.retrieval_cache.set(cache_key, list(law_hashes), relevant_laws)
+        
+        # Respetar el orden en que se seleccionaron las leyes
+        return sorted(relevant_laws, key=lambda law: selected_pdfs.index(law['law_number']))
+
     def ask_specific(self, question: str, selected_pdfs: List[str]):
         """Responde preguntas basadas en PDFs específicos"""
         try:
             db = next(get_db())
-            relevant_laws = []
-            
-            # Buscar documentos en la base de datos
-            for law_number in selected_pdfs:
-                law = db.query(LawDocument).filter_by(law_number=law_number).first()
-                if law:
-                    relevant_content = self.find_relevant_sections(question, law.content)
-                    relevant_laws.append({
-                        'law_number': law.law_number,
-                        'title': law.title,
-                        'content': relevant_content
-                    })
+            relevant_laws = self.retrieve_sections(question, selected_pdfs, db)
             
             if not relevant_laws:
                 return "No se encontraron los documentos seleccionados."
@@ -141,16 +198,14 @@ class PDFChatBot:
             )
             
             # Obtener respuesta de OpenAI
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            return self.llm.complete(
                 messages=[
                     {"role": "system", "content": "Eres un asistente experto en analizar documentos legales."},
                     {"role": "user", "content": prompt}
-                ]
+                ],
+                question=question
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             print(f"❌ Error en ask_specific: {str(e)}")
             return f"Error al procesar la pregunta: {str(e)}"
@@ -0,0 +1,266 @@
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional
+
+from openai import (
+    OpenAI,
+    RateLimitError,
+    APITimeoutError,
+    APIConnectionError,
+    InternalServerError,
+)
+
+# Palabras que indican una consulta de resumen (se responde con el modelo rápido)
+OVERVIEW_KEYWORDS = {
+    'resumen', 'resume', 'resumir', 'resúmeme', 'resumeme',
+    'overview', 'sintesis', 'síntesis', 'sintetiza',
+}
+OVERVIEW_PATTERN = re.compile(r'de\s+qu[eé]\s+trata')
+
+
+class LLMUnavailableError(Exception):
+    """Se agotaron los reintentos o el plazo de la llamada al LLM"""
+
+
+class LocalCapacityError(LLMUnavailableError):
+    """No hubo capacidad local (tasa o concurrencia) dentro del plazo del intento"""
+
+
+class HedgeCancelledError(Exception):
+    """La llamada de respaldo ya no es necesaria porque otra respondió"""
+
+
+# Errores transitorios que justifican reintentar la llamada
+RETRYABLE_ERRORS = (
+    RateLimitError, APITimeoutError, APIConnectionError, InternalServerError, LocalCapacityError
+)
+
+
+class TokenBucket:
+    """Limitador de tasa tipo token bucket, seguro entre hilos"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera hasta obtener un token.
+        Retorna False si no se consiguió antes de `timeout` segundos.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_time = (1 - self.tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait_time = min(wait_time, remaining)
+            time.sleep(wait_time)
+
+    def penalize(self, seconds: float):
+        """Vacía el bucket para respetar un Retry-After del servidor"""
+        with self.lock:
+            self._refill()
+            # Piso fijo: varios 429 simultáneos no acumulan deuda
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def refund(self):
+        """Devuelve un token que se tomó pero no se usó"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class LLMClient:
+    """
+    Envoltorio sobre el cliente de OpenAI con limitación de tasa compartida,
+    reintentos con backoff exponencial y jitter, plazo por llamada,
+    hedging de peticiones lentas y enrutamiento de modelo.
+
+    La configuración se toma de variables de entorno; OPENAI_BASE_URL permite
+    apuntar a un servidor falso local para pruebas de carga.
+    """
+
+    def __init__(self):
+        self.client = OpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            base_url=os.getenv('OPENAI_BASE_URL') or None,
+            max_retries=0,  # Los reintentos los gestiona este cliente
+        )
+        self.model = os.getenv('LLM_MODEL', 'gpt-3.5-turbo')
+        self.fast_model = os.getenv('LLM_FAST_MODEL', 'gpt-4o-mini')
+        self.fast_max_words = int(os.getenv('LLM_FAST_MAX_WORDS', '3'))
+
+        self.call_timeout = float(os.getenv('LLM_CALL_TIMEOUT', '30'))
+        self.deadline = float(os.getenv('LLM_DEADLINE', '60'))
+        self.max_retries = int(os.getenv('LLM_MAX_RETRIES', '4'))
+        self.backoff_base = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))
+        self.backoff_max = float(os.getenv('LLM_BACKOFF_MAX', '8'))
+        # Tope al Retry-After del servidor: un valor enorme no debe frenar todo el proceso
+        self.retry_after_max = float(os.getenv('LLM_RETRY_AFTER_MAX', '30'))
+        self.hedge_delay = float(os.getenv('LLM_HEDGE_DELAY', '0'))  # 0 desactiva el hedging
+
+        # Bucket, semáforo y pool únicos por cliente: se comparten entre todas las peticiones
+        max_concurrency = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+        self.bucket = TokenBucket(
+            rate=float(os.getenv('LLM_RATE_PER_SECOND', '3')),
+            capacity=int(os.getenv('LLM_BURST', '5')),
+        )
+        self.concurrency = threading.BoundedSemaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix='llm',
+        )
+
+    def choose_model(self, question: str) -> str:
+        """
+        Usa el modelo rápido solo para pedidos de resumen o preguntas muy cortas.
+        Sin pregunta no hay en qué basarse y se usa el modelo principal.
+        """
+        text = question.lower()
+        words = re.findall(r'\w+', text)
+        if not words:
+            return self.model
+        if (
+            len(words) <= self.fast_max_words
+            or OVERVIEW_KEYWORDS.intersection(words)
+            or OVERVIEW_PATTERN.search(text)
+        ):
+            return self.fast_model
+        return self.model
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Backoff exponencial con jitter completo; respeta Retry-After si existe"""
+        retry_after = None
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get('retry-after'))
+            except (TypeError, ValueError):
+                retry_after = None
+
+        if retry_after is not None:
+            retry_after = max(0.0, min(retry_after, self.retry_after_max, self.deadline))
+            self.bucket.penalize(retry_after)
+            return retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _create(self, model: str, messages: List[Dict], deadline: float,
+                cancelled: Optional[threading.Event] = None, **kwargs) -> str:
+        """
+        Una única llamada al API, sujeta al limitador de tasa y al límite de
+        concurrencia. `deadline` es un instante de time.monotonic(): el tiempo
+        de espera por capacidad se descuenta del que recibe el API. Si
+        `cancelled` se activa antes de llamar al API, se abandona sin consumir
+        capacidad.
+        """
+        if cancelled is not None and cancelled.is_set():
+            raise HedgeCancelledError()
+
+        if not self.bucket.acquire(timeout=max(0, deadline - time.monotonic())):
+            raise LocalCapacityError("Límite de tasa local: no hay capacidad disponible")
+        if not self.concurrency.acquire(timeout=max(0, deadline - time.monotonic())):
+            self.bucket.refund()
+            raise LocalCapacityError("Límite de concurrencia local: no hay capacidad disponible")
+
+        try:
+            if cancelled is not None and cancelled.is_set():
+                self.bucket.refund()
+                raise HedgeCancelledError()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.bucket.refund()
+                raise LocalCapacityError("El plazo del intento se agotó esperando capacidad")
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=remaining,
+                **kwargs
+            )
+            return response.choices[0].message.content
+        finally:
+            self.concurrency.release()
+
+    def _hedged_create(self, model: str, messages: List[Dict], timeout: float, **kwargs) -> str:
+        """
+        Lanza la llamada y, si no termina en `hedge_delay` segundos,
+        lanza una segunda idéntica; se usa la primera que responda bien.
+
+        La llamada perdedora que aún espera capacidad se abandona; una que ya
+        está en curso en el API no puede interrumpirse y termina por su cuenta,
+        aunque siempre dentro de su `timeout`.
+        """
+        deadline = time.monotonic() + timeout
+        if self.hedge_delay <= 0 or self.hedge_delay >= timeout:
+            return self._create(model, messages, deadline, **kwargs)
+
+        cancelled = threading.Event()
+        pending = {self.executor.submit(self._create, model, messages, deadline, cancelled, **kwargs)}
+        done, pending = wait(pending, timeout=self.hedge_delay)
+        pending |= done
+        if not done:
+            pending.add(self.executor.submit(self._create, model, messages, deadline, cancelled, **kwargs))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                cancelled.set()
+                for other in pending:
+                    other.cancel()
+                return result
+        # Todas las llamadas fallaron
+        raise error
+
+    def complete(self, messages: List[Dict], question: str = "", model: Optional[str] = None, **kwargs) -> str:
+        """
+        Obtiene una respuesta del LLM con reintentos dentro del plazo global.
+        Si no se indica `model`, se elige según la pregunta.
+        """
+        model = model or self.choose_model(question)
+        deadline = time.monotonic() + self.deadline
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                return self._hedged_create(
+                    model, messages, min(self.call_timeout, remaining), **kwargs
+                )
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+                delay = self._backoff(attempt, e)
+                print(f"⚠️ Error transitorio del LLM ({type(e).__name__}), reintento {attempt + 1} en {delay:.1f}s")
+                if time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+
+        raise LLMUnavailableError(
+            f"El servicio de IA no respondió a tiempo: {last_error or 'plazo agotado'}"
+        )
@@ -88,8 +88,18 @@ async def get_laws(db: Session = Depends(get_db)):
         print(f"❌ Error obteniendo leyes: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Retorna estadísticas de aciertos/fallos de la caché de recuperación"""
+    return {
+        "retrieval_cache": chatbot.retrieval_cache.get_stats(),
+        "status": "success"
+    }
+
+# Síncrona a propósito: FastAPI la ejecuta en su pool de hilos, así las
+# esperas y reintentos del LLM no bloquean el event loop
 @app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest):
+def chat_endpoint(request: ChatRequest):
     """Procesa preguntas sobre PDFs seleccionados"""
     try:
         print(f"📝 Pregunta recibida: {request.text}")
@@ -1,5 +1,6 @@
 from config import engine, Base, init_vector_extension
-from models import LawDocument
+from models import LawDocument, LawChunk
+from sqlalchemy import text
 
 def create_tables():
     print("🔄 Inicializando extensión pgvector...")
@@ -7,6 +8,11 @@ def create_tables():
     
     print("🔄 Creando tablas en la base de datos...")
     Base.metadata.create_all(bind=engine)
+
+    # create_all no agrega columnas a tablas existentes
+    with engine.begin() as conn:
+        for column in ('pdf_hash', 'pdf_etag', 'pdf_last_modified'):
+            conn.execute(text(f"ALTER TABLE law_documents ADD COLUMN IF NOT EXISTS {column} VARCHAR"))
     print("✅ Tablas creadas exitosamente")
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
 from sqlalchemy.sql import func
 from config import Base
 from pgvector.sqlalchemy import Vector
@@ -13,9 +13,24 @@ class LawDocument(Base):
     description = Column(String)              # Descripción
     content = Column(String)                  # Contenido procesado
     pdf_path = Column(String)                 # Ruta al archivo PDF
+    pdf_hash = Column(String)                 # SHA-256 del PDF para detectar cambios
+    pdf_etag = Column(String)                 # ETag del PDF para descargas condicionales
+    pdf_last_modified = Column(String)        # Last-Modified del PDF para descargas condicionales
     content_vector = Column(Vector(1536))     # Vector de embeddings para búsqueda semántica
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
 
     def __repr__(self):
-        return f"<LawDocument(law_number='{self.law_number}', title='{self.title}')>" 
\ No newline at end of file
+        return f"<LawDocument(law_number='{self.law_number}', title='{self.title}')>" 
+
+class LawChunk(Base):
+    __tablename__ = 'law_chunks'
+
+    id = Column(Integer, primary_key=True)
+    law_id = Column(Integer, ForeignKey('law_documents.id', ondelete='CASCADE'), index=True)
+    chunk_index = Column(Integer)             # Posición del fragmento dentro de la ley
+    chunk_hash = Column(String, index=True)   # SHA-256 del texto para el diff incremental
+    content = Column(String)                  # Texto del fragmento
+
+    def __repr__(self):
+        return f"<LawChunk(law_id={self.law_id}, chunk_index={self.chunk_index})>"
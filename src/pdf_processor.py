@@ -1,11 +1,12 @@
 import os
+import hashlib
 import requests
 import json
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Callable
 from pathlib import Path
 import re
 from sqlalchemy.orm import Session
-from models import LawDocument
+from models import LawDocument, LawChunk
 from config import get_db
 from docling.document_converter import DocumentConverter  # Importación correcta de docling
 
@@ -14,10 +15,13 @@ class PDFProcessor:
         self.storage_dir = Path(storage_dir)
         self.pdfs_dir = self.storage_dir / "pdfs"
         self.context_dir = self.storage_dir / "contexts"
+        self.conversions_dir = self.storage_dir / "conversions"
+        self.law_update_listeners: List[Callable[[str], None]] = []
         
         # Crear directorios si no existen
         self.pdfs_dir.mkdir(parents=True, exist_ok=True)
         self.context_dir.mkdir(parents=True, exist_ok=True)
+        self.conversions_dir.mkdir(parents=True, exist_ok=True)
 
     def sanitize_filename(self, filename: str) -> str:
         """Limpia el nombre del archivo para que sea válido"""
@@ -198,8 +202,26 @@ class PDFProcessor:
                     print(f"❌ Error leyendo contexto {context_path}: {str(e)}")
         return contexts
 
-    def process_with_docling(self, pdf_path: str) -> str:
-        """Procesa un PDF con DocLing y retorna el contenido procesado"""
+    def file_hash(self, path: Path) -> str:
+        """Calcula el SHA-256 de un archivo"""
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def process_with_docling(self, pdf_path: str, pdf_hash: str = None) -> str:
+        """
+        Procesa un PDF con DocLing y retorna el contenido procesado.
+        El resultado se guarda en caché por hash del PDF, así un mismo
+        archivo nunca se convierte dos veces.
+        """
+        pdf_hash = pdf_hash or self.file_hash(Path(pdf_path))
+        cache_path = self.conversions_dir / f"{pdf_hash}.md"
+        if cache_path.exists():
+            print(f"ℹ️ Usando conversión en caché para {pdf_path}")
+            return cache_path.read_text(encoding='utf-8')
+
         try:
             print(f"🔄 Procesando PDF con DocLing: {pdf_path}")
             
@@ -210,6 +232,8 @@ class PDFProcessor:
             # Extraer el texto en formato markdown
             content = result.document.export_to_markdown()
             
+            if content:
+                cache_path.write_text(content, encoding='utf-8')
             print(f"✅ PDF procesado exitosamente con DocLing")
             return content
             
@@ -217,50 +241,219 @@ class PDFProcessor:
             print(f"❌ Error procesando PDF con DocLing: {str(e)}")
             return ""
 
+    def remove_conversion(self, pdf_hash: str):
+        """Elimina la conversión en caché de una versión de PDF que ya no se usa"""
+        if not pdf_hash:
+            return
+        cache_path = self.conversions_dir / f"{pdf_hash}.md"
+        if cache_path.exists():
+            cache_path.unlink()
+            print(f"🗑️ Eliminada conversión obsoleta: {cache_path.name}")
+
+    def split_into_chunks(self, content: str, chunk_size: int = 1000) -> List[str]:
+        """
+        Divide el contenido en fragmentos respetando encabezados y párrafos.
+        Los cortes dependen del contenido y no de posiciones fijas, de modo
+        que un cambio local solo altera los fragmentos de su sección.
+        """
+        chunks = []
+        current = ""
+        for paragraph in re.split(r'\n\s*\n', content):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            starts_section = paragraph.startswith('#')
+            if current and (starts_section or len(current) + len(paragraph) > chunk_size):
+                chunks.append(current)
+                current = ""
+            # Párrafos más largos que el tamaño máximo se cortan directamente
+            while len(paragraph) > chunk_size:
+                chunks.append(paragraph[:chunk_size])
+                paragraph = paragraph[chunk_size:]
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def update_chunks(self, law_doc: LawDocument, content: str, db: Session) -> Dict:
+        """
+        Sincroniza los fragmentos de una ley con su nuevo contenido.
+        Solo se insertan los fragmentos cuyo hash no existía antes; los que
+        desaparecieron se eliminan y el resto se conserva tal cual.
+        """
+        new_chunks = self.split_into_chunks(content)
+        existing = db.query(LawChunk).filter_by(law_id=law_doc.id).all()
+
+        # Indexar fragmentos existentes por hash (puede haber repetidos)
+        by_hash = {}
+        for chunk in existing:
+            by_hash.setdefault(chunk.chunk_hash, []).append(chunk)
+
+        kept = []
+        added = []
+        for index, text in enumerate(new_chunks):
+            chunk_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            if by_hash.get(chunk_hash):
+                chunk = by_hash[chunk_hash].pop()
+                chunk.chunk_index = index
+                kept.append(chunk)
+            else:
+                added.append(LawChunk(
+                    law_id=law_doc.id,
+                    chunk_index=index,
+                    chunk_hash=chunk_hash,
+                    content=text
+                ))
+
+        removed = [chunk for chunks in by_hash.values() for chunk in chunks]
+        for chunk in removed:
+            db.delete(chunk)
+
+        db.add_all(added)
+        print(f"🧩 Fragmentos de {law_doc.law_number}: {len(kept)} sin cambios, "
+              f"{len(added)} nuevos, {len(removed)} eliminados")
+        return {'kept': len(kept), 'added': len(added), 'removed': len(removed)}
+
+    def backfill_chunks(self, law_doc: LawDocument, db: Session) -> bool:
+        """
+        Genera los fragmentos de una ley que no los tiene (por ejemplo, leyes
+        cargadas antes de existir la tabla o cuyo procesamiento falló).
+        Retorna True si se generaron.
+        """
+        if not law_doc.content:
+            return False
+        if db.query(LawChunk.id).filter_by(law_id=law_doc.id).first():
+            return False
+        self.update_chunks(law_doc, law_doc.content, db)
+        db.commit()
+        self.notify_law_updated(law_doc.law_number)
+        return True
+
+    def add_law_update_listener(self, callback: Callable[[str], None]):
+        """Registra una función a llamar con el número de ley cuando su contenido cambia"""
+        self.law_update_listeners.append(callback)
+
+    def notify_law_updated(self, law_number: str):
+        """Invalida las cachés dependientes de una ley"""
+        for callback in self.law_update_listeners:
+            try:
+                callback(law_number)
+            except Exception as e:
+                print(f"⚠️ Error invalidando caché de la ley {law_number}: {str(e)}")
+
+    def download_if_changed(self, pdf_url: str, pdf_path: Path, law_doc: LawDocument = None):
+        """
+        Descarga el PDF solo si cambió respecto a lo que ya tenemos.
+        Usa una petición condicional con el ETag/Last-Modified guardados; si
+        el servidor igual envía el archivo, se descarga a un temporal y solo
+        reemplaza al original cuando su hash es distinto.
+
+        Retorna (pdf_hash, etag, last_modified), o None si no hubo cambios.
+        """
+        headers = {}
+        if law_doc is not None and pdf_path.exists():
+            if law_doc.pdf_etag:
+                headers['If-None-Match'] = law_doc.pdf_etag
+            if law_doc.pdf_last_modified:
+                headers['If-Modified-Since'] = law_doc.pdf_last_modified
+
+        print(f"📥 Verificando {pdf_path.name}...")
+        response = requests.get(pdf_url, headers=headers, timeout=30)
+        if response.status_code == 304 and law_doc is not None:
+            # El servidor puede renovar los validadores junto con el 304
+            law_doc.pdf_etag = response.headers.get('ETag', law_doc.pdf_etag)
+            law_doc.pdf_last_modified = response.headers.get('Last-Modified', law_doc.pdf_last_modified)
+            return None
+        response.raise_for_status()
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        tmp_path = pdf_path.with_name(pdf_path.name + '.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(response.content)
+            pdf_hash = self.file_hash(tmp_path)
+
+            if law_doc is not None and law_doc.pdf_hash == pdf_hash and pdf_path.exists():
+                # Mismo contenido: solo se actualizan los validadores HTTP
+                law_doc.pdf_etag = etag
+                law_doc.pdf_last_modified = last_modified
+                return None
+
+            os.replace(tmp_path, pdf_path)
+            print(f"✅ PDF descargado: {pdf_path.name}")
+            return pdf_hash, etag, last_modified
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
     def process_pdf(self, pdf_url: str, metadata: dict, db: Session):
-        """Procesa un PDF y lo guarda en la base de datos"""
+        """
+        Procesa un PDF y lo guarda en la base de datos.
+        Si la ley ya existe, solo se re-procesa cuando su PDF cambió.
+        """
         try:
             # Extraer número de ley
             ley_nro = metadata['ley_nro'].replace('PL No ', '').replace('/', '').strip()
             
-            # Verificar si ya existe
             existing_law = db.query(LawDocument).filter_by(law_number=ley_nro).first()
-            if existing_law:
-                print(f"ℹ️ La ley {ley_nro} ya existe en la base de datos")
-                return existing_law
             
-            # Descargar PDF
             pdf_name = f"PL-No-{ley_nro}2024-2025.pdf"
             pdf_path = self.pdfs_dir / pdf_name
+            etag = last_modified = None
             
-            if not pdf_path.exists():
-                print(f"📥 Descargando {pdf_name}...")
-                response = requests.get(pdf_url)
-                with open(pdf_path, 'wb') as f:
-                    f.write(response.content)
-                print(f"✅ PDF descargado: {pdf_name}")
+            if existing_law or not pdf_path.exists():
+                downloaded = self.download_if_changed(pdf_url, pdf_path, existing_law)
+                if downloaded is None:
+                    print(f"ℹ️ La ley {ley_nro} no cambió")
+                    db.commit()  # Guardar validadores HTTP actualizados
+                    self.backfill_chunks(existing_law, db)
+                    return existing_law
+                pdf_hash, etag, last_modified = downloaded
+            else:
+                pdf_hash = self.file_hash(pdf_path)
             
             # Procesar con DocLing
-            content = self.process_with_docling(str(pdf_path))
+            content = self.process_with_docling(str(pdf_path), pdf_hash)
             
             if not content:
                 print(f"⚠️ No se pudo extraer contenido del PDF: {pdf_name}")
-                return None
+                return existing_law
             
-            # Guardar en la base de datos
-            law_doc = LawDocument(
-                law_number=ley_nro,
-                year="2024-2025",
-                title=metadata['titulo'],
-                description=metadata['descripcion'],
-                content=content,
-                pdf_path=str(pdf_path)
-            )
+            previous_hash = existing_law.pdf_hash if existing_law else None
+            if existing_law:
+                print(f"🔄 La ley {ley_nro} cambió, actualizando...")
+                law_doc = existing_law
+                law_doc.title = metadata['titulo']
+                law_doc.description = metadata['descripcion']
+                law_doc.content = content
+                law_doc.pdf_hash = pdf_hash
+                law_doc.pdf_etag = etag
+                law_doc.pdf_last_modified = last_modified
+            else:
+                law_doc = LawDocument(
+                    law_number=ley_nro,
+                    year="2024-2025",
+                    title=metadata['titulo'],
+                    description=metadata['descripcion'],
+                    content=content,
+                    pdf_path=str(pdf_path),
+                    pdf_hash=pdf_hash,
+                    pdf_etag=etag,
+                    pdf_last_modified=last_modified
+                )
+                db.add(law_doc)
+                db.flush()  # Obtener el id para los fragmentos
             
-            db.add(law_doc)
+            self.update_chunks(law_doc, content, db)
             db.commit()
             print(f"✅ Ley {ley_nro} guardada en la base de datos")
             
+            if existing_law:
+                if previous_hash != pdf_hash:
+                    self.remove_conversion(previous_hash)
+                self.notify_law_updated(ley_nro)
+            
             return law_doc
             
         except Exception as e:
@@ -285,6 +478,7 @@ class PDFProcessor:
             # 2. Obtener leyes locales
             local_laws = db.query(LawDocument).all()
             local_law_numbers = {law.law_number for law in local_laws}
+            hashes_before = {law.law_number: law.pdf_hash for law in local_laws}
             print(f"📚 Leyes locales: {len(local_law_numbers)}")
             
             # 3. Identificar leyes a eliminar (están local pero no en API)
@@ -294,6 +488,8 @@ class PDFProcessor:
                 for law_number in laws_to_delete:
                     # Eliminar de la base de datos
                     db.query(LawDocument).filter_by(law_number=law_number).delete()
+                    self.remove_conversion(hashes_before.get(law_number))
+                    self.notify_law_updated(law_number)
                     
                     # Eliminar PDF
                     pdf_path = self.pdfs_dir / f"PL-No-{law_number}2024-2025.pdf"
@@ -305,25 +501,31 @@ class PDFProcessor:
             laws_to_add = api_law_numbers - local_law_numbers
             if laws_to_add:
                 print(f"📥 Leyes nuevas a procesar: {laws_to_add}")
-                for item in api_laws:
-                    if 'acf' not in item or 'ley_nro' not in item['acf']:
-                        continue
-                        
-                    ley_nro = item['acf']['ley_nro'].replace('PL No ', '').replace('/', '').strip()
-                    if ley_nro in laws_to_add:
-                        self.process_pdf(
-                            pdf_url=item['acf']['archivo_ley'],
-                            metadata=item['acf'],
-                            db=db
-                        )
             
-            # 5. Confirmar cambios
+            # 5. Procesar nuevas y revisar existentes; process_pdf solo
+            #    re-procesa una ley existente si el hash de su PDF cambió
+            updated = 0
+            for item in api_laws:
+                if 'acf' not in item or 'ley_nro' not in item['acf']:
+                    continue
+                    
+                ley_nro = item['acf']['ley_nro'].replace('PL No ', '').replace('/', '').strip()
+                law_doc = self.process_pdf(
+                    pdf_url=item['acf']['archivo_ley'],
+                    metadata=item['acf'],
+                    db=db
+                )
+                if ley_nro not in laws_to_add and law_doc and law_doc.pdf_hash != hashes_before.get(ley_nro):
+                    updated += 1
+            
+            # 6. Confirmar cambios
             db.commit()
             print("✅ Sincronización completada")
             
             return {
                 'deleted': len(laws_to_delete),
                 'added': len(laws_to_add),
+                'updated': updated,
                 'current_total': len(api_law_numbers)
             }
             
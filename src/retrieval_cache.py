@@ -0,0 +1,197 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+# Versión del algoritmo de recuperación. Forma parte de la clave porque la
+# caché compartida sobrevive a reinicios y despliegues: incrementarla cada vez
+# que cambie la fragmentación (PDFProcessor.split_into_chunks) o el ranking
+# (PDFChatBot.rank_chunks / retrieve_sections).
+RETRIEVAL_VERSION = 2
+
+class RetrievalCache:
+    """
+    Caché de resultados de recuperación (fragmentos ordenados por ley).
+
+    Tiene dos niveles: un LRU acotado en memoria del proceso y una base
+    SQLite local que hace de caché compartida entre workers. La clave
+    combina los términos normalizados de la pregunta, los números de ley
+    ordenados y la versión del índice, de modo que un cambio en cualquier
+    PDF deja de producir aciertos sin necesidad de coordinación.
+    """
+
+    def __init__(self, db_path: str = "storage/retrieval_cache.sqlite", max_entries: int = 512,
+                 touch_interval: float = 60):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[Tuple[str, ...], List[Dict]]]" = OrderedDict()
+        # Último momento en que se refrescó accessed_at en la caché compartida
+        # por cada clave local; evita escribir en SQLite en cada acierto local
+        self.touch_interval = touch_interval
+        self.touched_at: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'shared_hits': 0, 'misses': 0}
+
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS retrieval_cache (
+                    key TEXT PRIMARY KEY,
+                    laws TEXT,
+                    value TEXT,
+                    accessed_at REAL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Conexión de corta duración: confirma al salir y siempre se cierra"""
+        conn = sqlite3.connect(str(self.db_path), timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def normalize_terms(question: str) -> List[str]:
+        """
+        Términos de la pregunta tal como los usa la búsqueda por palabras clave.
+        Se ordenan (conservando repetidos) porque el puntaje no depende del orden.
+        """
+        return sorted(re.findall(r'\w+', question.lower()))
+
+    @staticmethod
+    def index_version(law_hashes: Dict[str, Optional[str]]) -> str:
+        """Versión del índice para un conjunto de leyes, derivada del hash de cada PDF"""
+        items = "|".join(f"{law}:{law_hashes[law] or ''}" for law in sorted(law_hashes))
+        return hashlib.sha256(items.encode('utf-8')).hexdigest()
+
+    def make_key(self, question: str, law_hashes: Dict[str, Optional[str]]) -> str:
+        raw = json.dumps([
+            RETRIEVAL_VERSION,
+            self.normalize_terms(question),
+            sorted(law_hashes),
+            self.index_version(law_hashes),
+        ], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Retorna los resultados guardados o None si no hay acierto"""
+        now = time.time()
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                value = self.entries[key][1]
+                touch = now - self.touched_at.get(key, 0) >= self.touch_interval
+                if touch:
+                    self.touched_at[key] = now
+            else:
+                value = None
+
+        if value is not None:
+            # Las claves más usadas se sirven localmente: se refresca su uso en
+            # la caché compartida para que no parezcan frías al desalojar
+            if touch:
+                self._touch_shared(key, now)
+            return value
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT laws, value FROM retrieval_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE retrieval_cache SET accessed_at = ? WHERE key = ?",
+                        (now, key)
+                    )
+        except sqlite3.Error as e:
+            print(f"⚠️ Error leyendo caché compartida: {str(e)}")
+            row = None
+
+        with self.lock:
+            if row:
+                laws, value = tuple(json.loads(row[0])), json.loads(row[1])
+                self._store_local(key, laws, value)
+                self.touched_at[key] = now
+                self.stats['shared_hits'] += 1
+                return value
+            self.stats['misses'] += 1
+            return None
+
+    def _touch_shared(self, key: str, now: float):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE retrieval_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ Error actualizando caché compartida: {str(e)}")
+
+    def set(self, key: str, laws: List[str], value: List[Dict]):
+        """Guarda resultados en ambos niveles"""
+        with self.lock:
+            self._store_local(key, tuple(laws), value)
+            self.touched_at[key] = time.time()
+
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO retrieval_cache (key, laws, value, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(list(laws)), json.dumps(value, ensure_ascii=False), time.time())
+                )
+                # Mantener acotada la caché compartida eliminando lo menos usado
+                conn.execute("""
+                    DELETE FROM retrieval_cache WHERE key NOT IN (
+                        SELECT key FROM retrieval_cache ORDER BY accessed_at DESC LIMIT ?
+                    )
+                """, (self.max_entries * 4,))
+        except sqlite3.Error as e:
+            print(f"⚠️ Error escribiendo caché compartida: {str(e)}")
+
+    def _store_local(self, key: str, laws: Tuple[str, ...], value: List[Dict]):
+        self.entries[key] = (laws, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.touched_at.pop(evicted, None)
+
+    def invalidate_law(self, law_number: str):
+        """
+        Elimina las entradas que incluyen una ley (usado al re-indexarla).
+        Solo limpia el LRU de este proceso y la caché compartida; los demás
+        workers dejan de acertar porque la versión de la ley cambia en la clave.
+        """
+        with self.lock:
+            for key in [k for k, (laws, _) in self.entries.items() if law_number in laws]:
+                del self.entries[key]
+                self.touched_at.pop(key, None)
+
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "DELETE FROM retrieval_cache WHERE EXISTS "
+                    "(SELECT 1 FROM json_each(retrieval_cache.laws) WHERE json_each.value = ?)",
+                    (law_number,)
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ Error invalidando caché compartida: {str(e)}")
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['shared_hits'] + self.stats['misses']
+            hits = self.stats['hits'] + self.stats['shared_hits']
+            return {
+                **self.stats,
+                'size': len(self.entries),
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            }
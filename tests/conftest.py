@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Los módulos de src/ se importan por nombre (p. ej. `from config import get_db`)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
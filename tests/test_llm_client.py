@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_client import LLMClient, LLMUnavailableError, TokenBucket
+
+
+class FakeOpenAI:
+    """
+    Servidor HTTP local que imita /chat/completions.
+    `script` es una lista de respuestas que se consumen en orden; cada una es
+    (status, headers, delay_segundos). Al agotarse responde 200 sin demora.
+    """
+
+    def __init__(self, script=None):
+        self.script = list(script or [])
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with fake.lock:
+                    fake.requests += 1
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    status, headers, delay = fake.script.pop(0) if fake.script else (200, {}, 0)
+                try:
+                    time.sleep(delay)
+                    body = json.dumps({
+                        'id': 'x', 'object': 'chat.completion', 'created': 0, 'model': 'fake',
+                        'choices': [{
+                            'index': 0, 'finish_reason': 'stop',
+                            'message': {'role': 'assistant', 'content': 'ok'},
+                        }],
+                    } if status == 200 else {'error': {'message': 'fake', 'type': 'fake'}}).encode()
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with fake.lock:
+                        fake.in_flight -= 1
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    servers = []
+
+    def factory(script=None, **env):
+        server = FakeOpenAI(script)
+        servers.append(server)
+        settings = {
+            'OPENAI_API_KEY': 'test',
+            'OPENAI_BASE_URL': server.url,
+            'LLM_BACKOFF_BASE': '0.01',
+            'LLM_RATE_PER_SECOND': '100',
+            'LLM_BURST': '100',
+        }
+        settings.update(env)
+        for name, value in settings.items():
+            monkeypatch.setenv(name, value)
+        return LLMClient(), server
+
+    yield factory
+    for server in servers:
+        server.close()
+
+
+MESSAGES = [{'role': 'user', 'content': 'hola'}]
+
+
+def test_retries_transient_errors(make_client):
+    client, server = make_client([(429, {}, 0), (500, {}, 0)])
+    assert client.complete(MESSAGES) == 'ok'
+    assert server.requests == 3
+
+
+def test_honours_retry_after(make_client):
+    client, server = make_client([(429, {'Retry-After': '0.3'}, 0)])
+    started = time.monotonic()
+    assert client.complete(MESSAGES) == 'ok'
+    assert time.monotonic() - started >= 0.3
+    assert server.requests == 2
+
+
+def test_deadline_bounds_total_time(make_client):
+    client, server = make_client(
+        [(200, {}, 2)] * 5,
+        LLM_CALL_TIMEOUT='0.3',
+        LLM_DEADLINE='0.8',
+    )
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailableError):
+        client.complete(MESSAGES)
+    assert time.monotonic() - started < 1.5
+
+
+def test_hedging_returns_faster_response(make_client):
+    client, server = make_client(
+        [(200, {}, 1.5)],
+        LLM_HEDGE_DELAY='0.1',
+        LLM_CALL_TIMEOUT='3',
+    )
+    started = time.monotonic()
+    assert client.complete(MESSAGES) == 'ok'
+    assert time.monotonic() - started < 1
+    assert server.requests == 2
+
+
+def test_concurrency_limit_without_hedging(make_client):
+    client, server = make_client([(200, {}, 0.2)] * 6, LLM_MAX_CONCURRENCY='2')
+    threads = [threading.Thread(target=client.complete, args=(MESSAGES,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.max_in_flight <= 2
+
+
+def test_retry_after_is_clamped(make_client):
+    client, server = make_client(
+        [(429, {'Retry-After': '3600'}, 0)],
+        LLM_RETRY_AFTER_MAX='0.2',
+        LLM_RATE_PER_SECOND='10',
+    )
+    started = time.monotonic()
+    assert client.complete(MESSAGES) == 'ok'
+    assert time.monotonic() - started < 1
+    assert client.bucket.tokens >= -0.2 * 10
+
+
+def test_penalize_does_not_stack():
+    bucket = TokenBucket(rate=1, capacity=5)
+    for _ in range(5):
+        bucket.penalize(10)
+    assert bucket.tokens >= -10.1
+
+
+def test_routing_keeps_specific_questions_on_main_model(make_client):
+    client, _ = make_client()
+    assert client.choose_model("¿Qué sanciones establece el artículo 12?") == client.model
+    assert client.choose_model("Dame un resumen de la ley 307") == client.fast_model
+    assert client.choose_model("¿De qué trata este proyecto?") == client.fast_model
+    assert client.choose_model("") == client.model
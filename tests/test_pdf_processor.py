@@ -0,0 +1,201 @@
+import hashlib
+from pathlib import Path
+
+import pytest
+import requests
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import Base
+from models import LawDocument, LawChunk
+from pdf_processor import PDFProcessor
+
+SAMPLE_MD = Path(__file__).resolve().parent.parent / "data" / "PL-110-2024-2025.md"
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+@pytest.fixture
+def db():
+    # SQLite basta para estas pruebas: no se usan operadores de pgvector
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def processor(tmp_path):
+    return PDFProcessor(storage_dir=str(tmp_path / "storage"))
+
+
+@pytest.fixture
+def fake_get(monkeypatch):
+    """Sustituye requests.get; las respuestas se encolan en `replies`"""
+    calls = []
+    replies = []
+
+    def get(url, headers=None, timeout=None):
+        calls.append({'url': url, 'headers': headers or {}})
+        return replies.pop(0)
+
+    monkeypatch.setattr(requests, 'get', get)
+    get.calls = calls
+    get.replies = replies
+    return get
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def add_law(db, processor, law_number, pdf_bytes, content, **fields):
+    pdf_path = processor.pdfs_dir / f"PL-No-{law_number}2024-2025.pdf"
+    pdf_path.write_bytes(pdf_bytes)
+    law = LawDocument(
+        law_number=law_number, title="t", description="d", content=content,
+        pdf_path=str(pdf_path), pdf_hash=sha(pdf_bytes), **fields
+    )
+    db.add(law)
+    db.flush()
+    processor.update_chunks(law, content, db)
+    db.commit()
+    return law, pdf_path
+
+
+def chunk_rows(db, law):
+    return db.query(LawChunk).filter_by(law_id=law.id).order_by(LawChunk.chunk_index).all()
+
+
+def test_local_edit_on_real_bill_changes_few_chunks(processor):
+    content = SAMPLE_MD.read_text(encoding='latin-1')
+    paragraphs = content.split("\n\n")
+    middle = len(paragraphs) // 2
+    paragraphs[middle] += " Se agrega una oración al final del párrafo."
+    edited = "\n\n".join(paragraphs)
+
+    before = processor.split_into_chunks(content)
+    after = processor.split_into_chunks(edited)
+    assert len(before) > 10
+    assert len(set(after) - set(before)) <= 2
+
+
+def test_update_chunks_keeps_unchanged_rows(db, processor):
+    sections = [f"# Artículo {i}\n\nTexto del artículo {i}." for i in range(5)]
+    law, _ = add_law(db, processor, "307", b"pdf", "\n\n".join(sections))
+    ids_before = {row.content: row.id for row in chunk_rows(db, law)}
+
+    # Se inserta una sección al inicio y se edita otra
+    edited = ["# Preámbulo\n\nNuevo texto."] + sections
+    edited[3] = "# Artículo 2\n\nTexto del artículo 2, modificado."
+    result = processor.update_chunks(law, "\n\n".join(edited), db)
+    db.commit()
+
+    assert result == {'kept': 4, 'added': 2, 'removed': 1}
+    rows = chunk_rows(db, law)
+    assert [row.content for row in rows] == edited
+    for index, row in enumerate(rows):
+        assert row.chunk_index == index
+        if row.content in ids_before:
+            assert row.id == ids_before[row.content]
+
+
+def test_update_chunks_handles_repeated_chunks(db, processor):
+    repeated = "# Disposición\n\nTexto repetido."
+    law, _ = add_law(db, processor, "307", b"pdf", "\n\n".join([repeated, repeated, "# Fin\n\nCierre."]))
+    assert len(chunk_rows(db, law)) == 3
+
+    result = processor.update_chunks(law, "\n\n".join([repeated, "# Fin\n\nCierre."]), db)
+    db.commit()
+
+    assert result == {'kept': 2, 'added': 0, 'removed': 1}
+    assert [row.content for row in chunk_rows(db, law)] == [repeated, "# Fin\n\nCierre."]
+
+
+def test_update_chunks_deletes_removed_chunks(db, processor):
+    law, _ = add_law(db, processor, "307", b"pdf", "# A\n\nuno\n\n# B\n\ndos")
+    processor.update_chunks(law, "# A\n\nuno", db)
+    db.commit()
+    assert [row.content for row in chunk_rows(db, law)] == ["# A\n\nuno"]
+
+
+def test_backfill_chunks_only_when_missing(db, processor):
+    law = LawDocument(law_number="307", content="# A\n\nuno", pdf_hash="h")
+    db.add(law)
+    db.commit()
+    updated = []
+    processor.add_law_update_listener(updated.append)
+
+    assert processor.backfill_chunks(law, db) is True
+    assert processor.backfill_chunks(law, db) is False
+    assert len(chunk_rows(db, law)) == 1
+    assert updated == ["307"]
+
+
+def test_download_304_keeps_pdf_and_refreshes_validators(db, processor, fake_get):
+    law, pdf_path = add_law(db, processor, "307", b"v1", "x", pdf_etag='"a"', pdf_last_modified="lun")
+    fake_get.replies.append(FakeResponse(304, headers={'ETag': '"b"', 'Last-Modified': "mar"}))
+
+    assert processor.download_if_changed("http://pdf", pdf_path, law) is None
+    assert fake_get.calls[0]['headers'] == {'If-None-Match': '"a"', 'If-Modified-Since': "lun"}
+    assert pdf_path.read_bytes() == b"v1"
+    assert (law.pdf_etag, law.pdf_last_modified) == ('"b"', "mar")
+
+
+def test_download_same_hash_keeps_pdf_and_refreshes_validators(db, processor, fake_get):
+    law, pdf_path = add_law(db, processor, "307", b"v1", "x", pdf_etag='"a"')
+    fake_get.replies.append(FakeResponse(200, b"v1", {'ETag': '"b"', 'Last-Modified': "mar"}))
+
+    assert processor.download_if_changed("http://pdf", pdf_path, law) is None
+    assert pdf_path.read_bytes() == b"v1"
+    assert (law.pdf_etag, law.pdf_last_modified) == ('"b"', "mar")
+    assert list(processor.pdfs_dir.glob("*.tmp")) == []
+
+
+def test_process_pdf_reindexes_only_changed_law(db, processor, fake_get):
+    law, pdf_path = add_law(db, processor, "307", b"v1", "# A\n\nuno")
+    add_law(db, processor, "309", b"otro", "# B\n\ndos")
+    old_conversion = processor.conversions_dir / f"{sha(b'v1')}.md"
+    old_conversion.write_text("# A\n\nuno", encoding='utf-8')
+    # Conversión ya en caché para la nueva versión: no se invoca DocLing
+    (processor.conversions_dir / f"{sha(b'v2')}.md").write_text("# A\n\nuno modificado", encoding='utf-8')
+
+    updated = []
+    processor.add_law_update_listener(updated.append)
+    fake_get.replies.append(FakeResponse(200, b"v2", {'ETag': '"v2"'}))
+
+    result = processor.process_pdf(
+        "http://pdf", {'ley_nro': "PL No 307/", 'titulo': "t", 'descripcion': "d"}, db
+    )
+
+    assert result.pdf_hash == sha(b"v2")
+    assert result.pdf_etag == '"v2"'
+    assert pdf_path.read_bytes() == b"v2"
+    assert [row.content for row in chunk_rows(db, law)] == ["# A\n\nuno modificado"]
+    assert updated == ["307"]
+    assert not old_conversion.exists()
+
+
+def test_process_pdf_unchanged_law_is_not_reindexed(db, processor, fake_get):
+    law, pdf_path = add_law(db, processor, "307", b"v1", "# A\n\nuno", pdf_etag='"a"')
+    updated = []
+    processor.add_law_update_listener(updated.append)
+    fake_get.replies.append(FakeResponse(304))
+
+    result = processor.process_pdf(
+        "http://pdf", {'ley_nro': "PL No 307/", 'titulo': "t", 'descripcion': "d"}, db
+    )
+
+    assert result.pdf_hash == sha(b"v1")
+    assert pdf_path.read_bytes() == b"v1"
+    assert updated == []
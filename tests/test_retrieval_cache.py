@@ -0,0 +1,54 @@
+import sqlite3
+
+from retrieval_cache import RetrievalCache
+
+
+def shared_keys(cache):
+    with sqlite3.connect(str(cache.db_path)) as conn:
+        return {row[0] for row in conn.execute("SELECT key FROM retrieval_cache")}
+
+
+def test_key_ignores_term_order_and_tracks_index_version(tmp_path):
+    cache = RetrievalCache(str(tmp_path / "cache.sqlite"))
+    hashes = {'307': 'a', '309': 'b'}
+    key = cache.make_key("¿Qué dice la ley?", hashes)
+    assert key == cache.make_key("la ley dice qué", hashes)
+    assert key != cache.make_key("la ley dice qué", {'307': 'a', '309': 'c'})
+
+
+def test_shared_tier_is_visible_to_other_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    worker_a, worker_b = RetrievalCache(path), RetrievalCache(path)
+    worker_a.set('k', ['307'], [{'law_number': '307'}])
+
+    assert worker_b.get('k') == [{'law_number': '307'}]
+    assert worker_b.get_stats()['shared_hits'] == 1
+    assert worker_b.get('k') == [{'law_number': '307'}]
+    assert worker_b.get_stats()['hits'] == 1
+
+    worker_a.invalidate_law('307')
+    assert 'k' not in shared_keys(worker_a)
+
+
+def test_local_hits_refresh_shared_access_time(tmp_path):
+    cache = RetrievalCache(str(tmp_path / "cache.sqlite"), touch_interval=0)
+    cache.set('hot', ['307'], [])
+    with sqlite3.connect(str(cache.db_path)) as conn:
+        conn.execute("UPDATE retrieval_cache SET accessed_at = 0 WHERE key = 'hot'")
+
+    assert cache.get('hot') == []
+    assert cache.get_stats()['hits'] == 1
+    with sqlite3.connect(str(cache.db_path)) as conn:
+        accessed_at = conn.execute(
+            "SELECT accessed_at FROM retrieval_cache WHERE key = 'hot'"
+        ).fetchone()[0]
+    assert accessed_at > 0
+
+
+def test_key_changes_with_retrieval_version(tmp_path, monkeypatch):
+    import retrieval_cache
+
+    cache = RetrievalCache(str(tmp_path / "cache.sqlite"))
+    key = cache.make_key("ley", {'307': 'a'})
+    monkeypatch.setattr(retrieval_cache, 'RETRIEVAL_VERSION', retrieval_cache.RETRIEVAL_VERSION + 1)
+    assert cache.make_key("ley", {'307': 'a'}) != key